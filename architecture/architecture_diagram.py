@@ -2,93 +2,230 @@
 """
 AWS Trivia Challenge Architecture Diagram
 Run: pip install diagrams && python architecture_diagram.py
+Draft: DIAGRAM_FORMAT=dot python architecture_diagram.py (skips PNG rasterization)
+       DIAGRAM_LAYOUT=sfdp python architecture_diagram.py (force-directed layout)
+PNG via resvg: DIAGRAM_RASTERIZER=resvg python architecture_diagram.py (needs resvg on PATH)
+
+Rendered output is cached in .diagcache/ keyed on a hash of the diagram spec, this
+script's source, the custom icon and the installed diagrams/Graphviz, so re-running
+without changes copies the cached image instead of invoking Graphviz.
 """
 
-from diagrams import Diagram, Cluster, Edge
-from diagrams.aws.compute import Lambda
-from diagrams.aws.database import ElasticacheForRedis
-from diagrams import Node
-from diagrams.custom import Custom
-from diagrams.aws.network import APIGateway, CloudFront, NATGateway, InternetGateway, VPC
-from diagrams.aws.storage import S3
-from diagrams.aws.security import Cognito
-from diagrams.aws.integration import Eventbridge
-from diagrams.onprem.client import Users
-from diagrams.saas.cdn import Cloudflare
-
-with Diagram("AWS Trivia Challenge Architecture", show=False, direction="TB", graph_attr={"rankdir": "TB", "ranksep": "3.0", "nodesep": "2.0"}, edge_attr={"fontsize": "16", "labeldistance": "0.3", "labelangle": "0"}):
-    
-    users = Users("Users")
-        
-    with Cluster("AWS Cloud"):
-        # Global services outside VPC
-        cloudfront = CloudFront("CloudFront CDN")
-        cognito = Cognito("Cognito User Pool")
-        s3 = S3("S3 Frontend Bucket")
-        api_gw = APIGateway("API Gateway")
-        eventbridge = Eventbridge("EventBridge")
-        
-        # Internet Gateway at VPC boundary
-        igw = InternetGateway("Internet Gateway")
-        
-        with Cluster("VPC", graph_attr={"style": "rounded", "bgcolor": "lightblue"}):
-            
-            with Cluster("Public Subnet", graph_attr={"rank": "min"}):
-                nat = NATGateway("NAT Gateway")
-            
-            with Cluster("Private Subnet", graph_attr={"rank": "max"}):
-                with Cluster("Compute"):
-                    lambda_main = Lambda("Game Logic\nLambda")
-                    lambda_preloader = Lambda("Question Preloader\nLambda")
-                
-                with Cluster("Data"):
-                    elasticache = Custom("ElastiCache", "./elasticache-serverless-icon.png")
-    
-    with Cluster("External"):
-        opentdb = Cloudflare("OpenTDB API")
-        
-    # Bidirectional user access flow
-    users >> cloudfront
-    cloudfront >> Edge(style="dashed") >> users
-    
-    # Bidirectional CloudFront and S3 connection
-    cloudfront >> s3
-    s3 >> Edge(style="dashed") >> cloudfront
-    
-    # Direct authentication flow (dotted for auth)
-    users >> Edge(style="dotted") >> cognito
-    cognito >> Edge(style="dotted") >> users
-    
-    # API requests through CloudFront
-    cloudfront >> api_gw
-    
-    # Bidirectional Lambda and API Gateway
-    api_gw >> lambda_main
-    lambda_main >> Edge(style="dashed") >> api_gw
-    
-    # Bidirectional cache operations
-    lambda_main >> elasticache
-    elasticache >> Edge(style="dashed") >> lambda_main
-    
-    # Question preloader cache operations
-    lambda_preloader >> elasticache
-    elasticache >> Edge(style="dashed") >> lambda_preloader
-    
-    # Scheduled event flow (bold for events)
-    eventbridge >> Edge(style="bold", penwidth="3") >> lambda_preloader
-    
-    # Complete question preloading flow
-    lambda_preloader >> nat
-    nat >> igw
-    igw >> opentdb
-    
-    # Response back through same path
-    opentdb >> Edge(style="dashed") >> igw
-    igw >> Edge(style="dashed") >> nat
-    nat >> Edge(style="dashed") >> lambda_preloader
-    
-    # Legend at bottom
-    with Cluster("", graph_attr={"style": "invis", "rank": "sink"}):
-        from diagrams import Node
-        Node("━━━ Primary Data Flow    - - - Response Flow    ••••• Authentication Flow    ▄▄▄ Scheduled Events", shape="plaintext", fontsize="10")
-    
+import functools
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import shutil
+import subprocess
+
+TITLE = "AWS Trivia Challenge Architecture"
+FILENAME = "aws_trivia_challenge_architecture"
+# Resolved against this file so the script works from any working directory
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, ".diagcache")
+ELASTICACHE_ICON = os.path.join(HERE, "elasticache-serverless-icon.png")
+# Caps Graphviz network-simplex/mincross iterations for quick "dot" drafts
+DRAFT_GRAPH_ATTR = {"nslimit": "1", "mclimit": "1"}
+# Used when DIAGRAM_LAYOUT selects a non-hierarchical engine; the published image keeps dot
+FAST_LAYOUT_GRAPH_ATTR = {"overlap": "prism", "splines": "true"}
+EDGE_ATTR = {"fontsize": "16", "labeldistance": "0.3", "labelangle": "0"}
+
+# Edge styles, matching the legend entries
+EDGE_STYLES = {
+    "primary": {},
+    "response": {"style": "dashed"},
+    "auth": {"style": "dotted"},
+    "event": {"style": "bold", "penwidth": "3"},
+}
+
+LEGEND = "━━━ Primary Data Flow    - - - Response Flow    ••••• Authentication Flow    ▄▄▄ Scheduled Events"
+
+
+@functools.lru_cache(None)
+def diagram_spec():
+    """Return the diagram as a (nodes, edges, graph_attr) tuple.
+
+    Nodes are ("node", key, cls, args, attrs) or ("cluster", label, graph_attr, children),
+    where cls is a class path under the diagrams package, e.g. "aws.compute.Lambda".
+    Edges are (src, dst, style) with style a key of EDGE_STYLES.
+    """
+    nodes = (
+        ("node", "users", "onprem.client.Users", ("Users",), {}),
+        ("cluster", "AWS Cloud", {}, (
+            # Global services outside VPC
+            ("node", "cloudfront", "aws.network.CloudFront", ("CloudFront CDN",), {}),
+            ("node", "cognito", "aws.security.Cognito", ("Cognito User Pool",), {}),
+            ("node", "s3", "aws.storage.S3", ("S3 Frontend Bucket",), {}),
+            ("node", "api_gw", "aws.network.APIGateway", ("API Gateway",), {}),
+            ("node", "eventbridge", "aws.integration.Eventbridge", ("EventBridge",), {}),
+            # Internet Gateway at VPC boundary
+            ("node", "igw", "aws.network.InternetGateway", ("Internet Gateway",), {}),
+            ("cluster", "VPC", {"style": "rounded", "bgcolor": "lightblue"}, (
+                ("cluster", "Public Subnet", {"rank": "min"}, (
+                    ("node", "nat", "aws.network.NATGateway", ("NAT Gateway",), {}),
+                )),
+                ("cluster", "Private Subnet", {"rank": "max"}, (
+                    ("cluster", "Compute", {}, (
+                        ("node", "lambda_main", "aws.compute.Lambda", ("Game Logic\nLambda",), {}),
+                        ("node", "lambda_preloader", "aws.compute.Lambda", ("Question Preloader\nLambda",), {}),
+                    )),
+                    ("cluster", "Data", {}, (
+                        ("node", "elasticache", "custom.Custom", ("ElastiCache", ELASTICACHE_ICON), {}),
+                    )),
+                )),
+            )),
+        )),
+        ("cluster", "External", {}, (
+            ("node", "opentdb", "saas.cdn.Cloudflare", ("OpenTDB API",), {}),
+        )),
+    )
+
+    edges = (
+        # Bidirectional user access flow
+        ("users", "cloudfront", "primary"),
+        ("cloudfront", "users", "response"),
+        # Bidirectional CloudFront and S3 connection
+        ("cloudfront", "s3", "primary"),
+        ("s3", "cloudfront", "response"),
+        # Direct authentication flow (dotted for auth)
+        ("users", "cognito", "auth"),
+        ("cognito", "users", "auth"),
+        # API requests through CloudFront
+        ("cloudfront", "api_gw", "primary"),
+        # Bidirectional Lambda and API Gateway
+        ("api_gw", "lambda_main", "primary"),
+        ("lambda_main", "api_gw", "response"),
+        # Bidirectional cache operations
+        ("lambda_main", "elasticache", "primary"),
+        ("elasticache", "lambda_main", "response"),
+        # Question preloader cache operations
+        ("lambda_preloader", "elasticache", "primary"),
+        ("elasticache", "lambda_preloader", "response"),
+        # Scheduled event flow (bold for events)
+        ("eventbridge", "lambda_preloader", "event"),
+        # Complete question preloading flow
+        ("lambda_preloader", "nat", "primary"),
+        ("nat", "igw", "primary"),
+        ("igw", "opentdb", "primary"),
+        # Response back through same path
+        ("opentdb", "igw", "response"),
+        ("igw", "nat", "response"),
+        ("nat", "lambda_preloader", "response"),
+    )
+
+    graph_attr = {"rankdir": "TB", "ranksep": "3.0", "nodesep": "2.0"}
+    return nodes, edges, graph_attr
+
+
+def toolchain_stamp():
+    """Identify the installed diagrams package and Graphviz binary.
+
+    diagrams decides the stock icon paths and default attributes, and Graphviz the
+    layout, so upgrading either must invalidate the cache.
+    """
+    try:
+        diagrams_version = importlib.metadata.version("diagrams")
+    except importlib.metadata.PackageNotFoundError:
+        diagrams_version = None
+    dot = shutil.which("dot")
+    dot_stat = os.stat(dot) if dot else None
+    return diagrams_version, dot, dot_stat and (dot_stat.st_size, dot_stat.st_mtime_ns)
+
+
+def spec_key(spec, outformat, rasterizer):
+    """Hash everything that affects the rendered output.
+
+    Besides the spec and render options this covers the script source (so editing any
+    render-time constant invalidates the cache), the custom icon and the toolchain.
+    """
+    digest = hashlib.blake2b(repr((spec, outformat, rasterizer, toolchain_stamp())).encode())
+    with open(os.path.abspath(__file__), "rb") as source:
+        digest.update(source.read())
+    with open(ELASTICACHE_ICON, "rb") as icon:
+        digest.update(icon.read())
+    return digest.hexdigest()
+
+
+def node_class(path):
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(f"diagrams.{module}"), name)
+
+
+def add_nodes(entries, created):
+    from diagrams import Cluster
+
+    for entry in entries:
+        if entry[0] == "cluster":
+            _, label, graph_attr, children = entry
+            with Cluster(label, graph_attr=graph_attr):
+                add_nodes(children, created)
+        else:
+            _, key, cls, args, attrs = entry
+            created[key] = node_class(cls)(*args, **attrs)
+
+
+def render(spec, outformat):
+    # Imported here so cache hits never pay the diagrams import cost
+    from diagrams import Diagram, Cluster, Edge, Node
+
+    nodes, edges, graph_attr = spec
+    with Diagram(TITLE, filename=FILENAME, show=False, outformat=outformat, direction="TB", graph_attr=graph_attr, edge_attr=EDGE_ATTR):
+        created = {}
+        add_nodes(nodes, created)
+        for src, dst, style in edges:
+            created[src] >> Edge(**EDGE_STYLES[style]) >> created[dst]
+
+        # Legend at bottom
+        with Cluster("", graph_attr={"style": "invis", "rank": "sink"}):
+            Node(LEGEND, shape="plaintext", fontsize="10")
+
+
+def build_diagram():
+    outformat = os.environ.get("DIAGRAM_FORMAT", "png")
+    rasterizer = os.environ.get("DIAGRAM_RASTERIZER", "graphviz")
+    nodes, edges, graph_attr = diagram_spec()
+    if outformat == "dot":
+        graph_attr = {**graph_attr, **DRAFT_GRAPH_ATTR}
+    layout = os.environ.get("DIAGRAM_LAYOUT", "dot")
+    if layout != "dot":
+        graph_attr = {**graph_attr, "layout": layout, **FAST_LAYOUT_GRAPH_ATTR}
+    spec = (nodes, edges, graph_attr)
+
+    key = spec_key(spec, outformat, rasterizer)
+    target = f"{FILENAME}.{outformat}"
+    cached = os.path.join(CACHE_DIR, f"{key}.{outformat}")
+
+    if os.path.exists(cached):
+        shutil.copy(cached, target)
+        return
+
+    if outformat == "png" and rasterizer == "resvg":
+        # Graphviz's SVG output skips Cairo/Pango; resvg rasterizes it instead
+        if shutil.which("resvg") is None:
+            raise RuntimeError("DIAGRAM_RASTERIZER=resvg but resvg is not on PATH; install it or unset the variable")
+        svg = f"{FILENAME}.svg"
+        try:
+            render(spec, "svg")
+            subprocess.run(["resvg", svg, target], check=True)
+        finally:
+            if os.path.exists(svg):
+                os.remove(svg)
+    else:
+        render(spec, outformat)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    shutil.copy(target, cached)
+    index_path = os.path.join(CACHE_DIR, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    index[key] = target
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+
+
+if __name__ == "__main__":
+    build_diagram()